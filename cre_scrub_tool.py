@@ -3,12 +3,22 @@ import os
 os.environ["STREAMLIT_SERVER_ADDRESS"] = "0.0.0.0"
 os.environ["STREAMLIT_SERVER_PORT"] = os.environ.get("PORT", "8501")
 
-import re
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from pathlib import Path
-import pandas as pd
 import streamlit as st
 
+from scrubber_core import (
+    pd,
+    EXCEL_ENGINE,
+    clean_numeric,
+    compact_output,
+    rename_columns,
+    sc_retail_mask,
+    to_excel_bytes,
+    to_parquet_bytes,
+)
+
 st.set_page_config(page_title="SC Retail Property Scrubber & Owner Join", layout="wide")
 st.title("SC Retail Property Scrubber — Property + Owner Join")
 
@@ -60,6 +70,10 @@ DEF_SIZE_COLS = [
     "size_sf",
 ]
 
+# Only these headers (or ones already in normalised form) are used downstream;
+# everything else is skipped at read time
+ALLOWED_COLS = frozenset(COLUMN_MAP) | frozenset(COLUMN_MAP.values())
+
 OUT_COLS = [
     "property_name",
     "address",
@@ -71,81 +85,112 @@ OUT_COLS = [
     "company_phone",
 ]
 
-def _clean_numeric(val):
-    try:
-        if pd.isna(val): return pd.NA
-        return pd.to_numeric(re.sub(r"[^0-9.]", "", str(val)), errors="coerce")
-    except Exception: return pd.NA
+# Per-file frames are reindexed to these right away so every concat sees identical columns
+OWNER_COLS = ["address_key", "company_name", "company_address", "company_phone"]
+PROP_COLS = [c for c in OUT_COLS if c not in OWNER_COLS] + ["address_key"]
 
 def normalise(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.rename(columns={c: COLUMN_MAP.get(c, c) for c in df.columns})
+    df = rename_columns(df, COLUMN_MAP)
     if "size_sf" not in df.columns:
         for alt in ["RBA", "Total Available Space (SF)", "Rentable Building Area"]:
             if alt in df.columns:
                 df["size_sf"] = df[alt]
                 break
-    df["size_sf"] = df["size_sf"].apply(_clean_numeric) if "size_sf" in df.columns else pd.NA
-    df["address_key"] = df["address"].astype(str).str.strip().str.lower()
+    df["size_sf"] = clean_numeric(df["size_sf"]) if "size_sf" in df.columns else pd.NA
+    # Arrow-backed strings so strip/lower run as pyarrow compute kernels
+    df["address_key"] = df["address"].astype("string[pyarrow]").str.strip().str.lower()
     return df
 
-def load_all_sheets(file):
-    if Path(file.name).suffix.lower().startswith(".csv"):
-        return [pd.read_csv(file)]
+CSV_CHUNK_ROWS = 100_000
+
+def load_all_sheets(name, buf):
+    if Path(name).suffix.lower().startswith(".csv"):
+        # Stream CSVs in chunks so only rows that survive the filter stay in memory
+        yield from pd.read_csv(buf, chunksize=CSV_CHUNK_ROWS, usecols=lambda c: c in ALLOWED_COLS)
     else:
-        return list(pd.read_excel(file, sheet_name=None).values())
+        xl = pd.ExcelFile(buf, engine=EXCEL_ENGINE)
+        for sheet_name in xl.sheet_names:
+            # one read per sheet: calamine parses the whole sheet even for a header-only peek
+            df = pd.read_excel(xl, sheet_name=sheet_name, usecols=lambda c: c in ALLOWED_COLS)
+            # notes/summary tabs with no usable columns come back empty
+            if df.columns.empty:
+                continue
+            yield df
+
+def filter_sc_retail(df: pd.DataFrame) -> pd.DataFrame:
+    # a sheet missing any filter column can't contain a match
+    if not {"property_type", "state", "size_sf"}.issubset(df.columns):
+        return df.iloc[0:0]
+    return df.loc[sc_retail_mask(df)]
+
+@st.cache_data(show_spinner=False)
+def process_file(name: str, data: bytes):
+    """Read, normalise and filter one upload; returns (property_df, owner_df), either may be None."""
+    prop_frames, owner_frames = [], []
+    for sheet in load_all_sheets(name, BytesIO(data)):
+        sheet = normalise(sheet)
+        if {"company_name", "company_phone"}.intersection(sheet.columns):
+            owner_frames.append(sheet.reindex(columns=OWNER_COLS))
+        else:
+            prop_frames.append(filter_sc_retail(sheet).reindex(columns=PROP_COLS))
+    prop_df = pd.concat(prop_frames, ignore_index=True) if prop_frames else None
+    owner_df = pd.concat(owner_frames, ignore_index=True) if owner_frames else None
+    return prop_df, owner_df
+
+def _process_upload(f):
+    # Runs on a worker thread, so failures are returned and reported by the main script
+    try:
+        return process_file(f.name, f.getvalue()), None
+    except Exception as exc:
+        return (None, None), exc
 
 if uploaded_files:
     st.info("Processing…")
     prop_frames, owner_frames = [], []
 
-    for f in uploaded_files:
-        for sheet in load_all_sheets(f):
-            sheet = normalise(sheet)
-            if {"company_name", "company_phone"}.intersection(sheet.columns):
-                owner_frames.append(sheet)
-            else:
-                prop_frames.append(sheet)
+    # Cached on the file bytes, so widget reruns skip the read/normalise/filter work.
+    # Readers release the GIL while parsing, so several uploads are processed at once.
+    with ThreadPoolExecutor(max_workers=min(8, len(uploaded_files))) as ex:
+        results = list(ex.map(_process_upload, uploaded_files))
+
+    for f, ((prop_df, owner_df), err) in zip(uploaded_files, results):
+        if err is not None:
+            st.error(f"Could not read {f.name}: {err}")
+            continue
+        if prop_df is not None:
+            prop_frames.append(prop_df)
+        if owner_df is not None:
+            owner_frames.append(owner_df)
 
     if not prop_frames:
         st.error("No property sheet detected (needs columns like Property Type / RBA).")
         st.stop()
 
     prop_df = pd.concat(prop_frames, ignore_index=True)
-    owners_df = pd.concat(owner_frames, ignore_index=True) if owner_frames else pd.DataFrame(columns=["address_key"])
-
-    merged = prop_df.merge(
-        owners_df[["address_key", "company_name", "company_address", "company_phone"]],
-        on="address_key",
-        how="left"
-    )
-
-    # Retail SC filter
-    mask = (
-        merged["property_type"].astype(str).str.contains("retail", case=False, na=False)
-        & (merged["state"].str.upper() == "SC")
-        & merged["size_sf"].between(1500, 30000, inclusive="both")
-    )
-    filtered = merged.loc[mask]
+    if prop_df.empty:
+        st.success("Done! 0 matching rows.")
+        st.stop()
+
+    if owner_frames:
+        owners_df = pd.concat(owner_frames, ignore_index=True).drop_duplicates("address_key")
+    else:
+        owners_df = pd.DataFrame(columns=OWNER_COLS)
+
+    # Owner keys are unique after dedup, so a single hash lookup replaces the merge
+    owner_info = owners_df.set_index("address_key").reindex(prop_df["address_key"])
+    filtered = prop_df.assign(**{c: owner_info[c].to_numpy() for c in owner_info.columns})
 
     # Final ordering
-    for col in OUT_COLS:
-        if col not in filtered: filtered[col] = pd.NA
-    filtered = filtered[OUT_COLS]
+    filtered = compact_output(filtered[OUT_COLS])
 
     st.success(f"Done! {len(filtered)} matching rows.")
     st.dataframe(filtered, use_container_width=True)
 
-    bio = BytesIO()
-    with pd.ExcelWriter(bio, engine="xlsxwriter") as w:
-        filtered.to_excel(w, index=False, sheet_name="Merged")
-    bio.seek(0)
-
-    st.download_button("📥 Download merged Excel", data=bio.getvalue(),
-                       file_name="SC_Retail_Merged.xlsx",
-                       mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-else:
-    st.info("👋 Upload your Property and Owner CoStar exports to get started.")
+    st.download_button("📥 Download merged Excel", data=to_excel_bytes(filtered, "Merged"),
                        file_name="SC_Retail_Merged.xlsx",
                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    st.download_button("📥 Download Parquet", data=to_parquet_bytes(filtered),
+                       file_name="SC_Retail_Merged.parquet",
+                       mime="application/octet-stream")
 else:
     st.info("👋 Upload your Property and Owner CoStar exports to get started.")
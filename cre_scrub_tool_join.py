@@ -1,10 +1,20 @@
 
-import re
 from io import BytesIO
 from pathlib import Path
-import pandas as pd
 import streamlit as st
 
+from scrubber_core import (
+    pd,
+    EXCEL_ENGINE,
+    clean_numeric,
+    compact_output,
+    rename_columns,
+    sc_retail_mask,
+    to_csv_bytes,
+    to_excel_bytes,
+    to_parquet_bytes,
+)
+
 # ---------- Column mapping ----------
 COLUMN_MAP = {
     "Property Name": "property_name",
@@ -32,6 +42,9 @@ COLUMN_MAP = {
     "Phone": "company_phone",
 }
 
+# Only mapped headers (or ones already in normalised form) are used, so skip the rest at read time
+ALLOWED_COLS = frozenset(COLUMN_MAP) | frozenset(COLUMN_MAP.values())
+
 OUTPUT_COLS = [
     "property_name",
     "address",
@@ -46,32 +59,19 @@ OUTPUT_COLS = [
     "company_phone",
 ]
 
-# ---------- Helpers ----------
-def _clean_numeric(val):
-    try:
-        if pd.isna(val):
-            return pd.NA
-        return pd.to_numeric(re.sub(r"[^0-9.]", "", str(val)), errors="coerce")
-    except Exception:
-        return pd.NA
-
-
-def make_key(addr, city):
-    if pd.isna(addr) or pd.isna(city):
-        return ""
-    key = f"{addr} {city}".lower()
-    key = re.sub(r"[^a-z0-9]", "", key)
-    return key
-
+# Both sides are projected to these before the merge so unused columns never enter the join
+OWNER_COLS = ["join_key", "company_name", "company_address", "company_phone"]
+PROP_COLS = [c for c in OUTPUT_COLS if c not in OWNER_COLS] + ["join_key"]
 
+# ---------- Helpers ----------
 def normalise(df: pd.DataFrame) -> pd.DataFrame:
     # rename headers
-    df = df.rename(columns={c: COLUMN_MAP.get(c, c) for c in df.columns})
+    df = rename_columns(df, COLUMN_MAP)
 
     # ensure size column
     if "size_sf" not in df.columns:
         df["size_sf"] = pd.NA
-    df["size_sf"] = df["size_sf"].apply(_clean_numeric)
+    df["size_sf"] = clean_numeric(df["size_sf"])
 
     # ensure address/city columns
     if "address" not in df.columns:
@@ -79,16 +79,28 @@ def normalise(df: pd.DataFrame) -> pd.DataFrame:
     if "city" not in df.columns:
         df["city"] = pd.NA
 
-    # join key
-    df["join_key"] = df.apply(lambda r: make_key(r["address"], r["city"]), axis=1)
+    # join key: lower-cased address + city with everything but [a-z0-9] removed,
+    # empty when either part is missing
+    addr = df["address"].astype("string[pyarrow]")
+    city = df["city"].astype("string[pyarrow]")
+    key = (addr.fillna("") + " " + city.fillna("")).str.lower()
+    # plain-string pattern on purpose, see scrubber_core.clean_numeric
+    key = key.str.replace(r"[^a-z0-9]", "", regex=True)
+    df["join_key"] = key.mask(addr.isna() | city.isna(), "")
     return df
 
 
-def load_excel(file) -> pd.DataFrame:
-    """Load every sheet in an Excel file into one DataFrame."""
-    xl = pd.read_excel(file, sheet_name=None)
-    frames = [normalise(s) for s in xl.values()]
-    return pd.concat(frames, ignore_index=True)
+@st.cache_data(show_spinner=False)
+def load_excel(data: bytes) -> pd.DataFrame:
+    """Load every sheet in an Excel file's bytes into one DataFrame (cached per upload)."""
+    xl = pd.read_excel(
+        BytesIO(data), sheet_name=None, usecols=lambda c: c in ALLOWED_COLS, engine=EXCEL_ENGINE
+    )
+    # headers are renamed per sheet so the sheets line up, then the frame is normalised once
+    frames = [rename_columns(s, COLUMN_MAP) for s in xl.values()]
+    df = normalise(pd.concat(frames, ignore_index=True))
+    # low-cardinality filter columns as categories, so string checks run per category
+    return df.astype({c: "category" for c in ("state", "property_type") if c in df.columns})
 
 
 # ---------- Streamlit UI ----------
@@ -104,51 +116,54 @@ files = st.file_uploader(
 if files and len(files) == 2:
     st.info("Processing… please wait ⌛")
 
-    # Load & normalise both files
-    df_prop = load_excel(files[0])
-    df_owner = load_excel(files[1])
+    # Load & normalise both files; getvalue() returns the buffered upload regardless of read position
+    df_prop = load_excel(files[0].getvalue())
+    df_owner = load_excel(files[1].getvalue())
 
-    # Left‑join owner info onto properties via join_key
-    owner_cols = ["join_key", "company_name", "company_address", "company_phone"]
-    df_owner = df_owner[owner_cols].drop_duplicates("join_key")
-
-    merged = df_prop.merge(df_owner, on="join_key", how="left")
-
-    # Guarantee required cols
-    for col in ["property_type", "state", "size_sf"]:
-        if col not in merged.columns:
-            merged[col] = pd.NA
+    # Project the property side (adding any missing filter/output columns) and apply the
+    # SC retail + size filter before the join, so only matching properties are probed
+    df_prop = df_prop.reindex(columns=PROP_COLS)
+    df_prop = df_prop[sc_retail_mask(df_prop)]
+    if df_prop.empty:
+        st.success("Done! 0 matching properties found.")
+        st.stop()
 
-    merged["size_sf"] = pd.to_numeric(merged["size_sf"], errors="coerce")
+    # Left‑join owner info onto properties via join_key
+    df_owner = df_owner[OWNER_COLS].drop_duplicates("join_key")
 
-    # Apply SC retail + size filter
-    filtered = merged[
-        merged["property_type"].astype(str).str.contains("retail", case=False, na=False)
-        & (merged["state"].str.upper() == "SC")
-        & merged["size_sf"].between(1500, 30000, inclusive="both")
-    ]
+    # Factorise both key columns in one pass so the merge hashes integer codes, not strings
+    all_keys = pd.concat([df_owner["join_key"], df_prop["join_key"]], ignore_index=True)
+    codes, _ = pd.factorize(all_keys)
+    df_owner = df_owner.assign(join_key=codes[: len(df_owner)])
+    df_prop = df_prop.assign(join_key=codes[len(df_owner) :])
 
-    # Ensure all output columns exist
-    for col in OUTPUT_COLS:
-        if col not in filtered.columns:
-            filtered[col] = pd.NA
+    filtered = df_prop.merge(df_owner, on="join_key", how="left", validate="many_to_one")
 
-    filtered = filtered[OUTPUT_COLS]
+    # Ensure all output columns exist, in output order
+    filtered = compact_output(filtered.reindex(columns=OUTPUT_COLS))
 
     st.success(f"Done! {len(filtered)} matching properties found.")
     st.dataframe(filtered, use_container_width=True)
 
-    # Download button
-    out = BytesIO()
-    with pd.ExcelWriter(out, engine="xlsxwriter") as writer:
-        filtered.to_excel(writer, index=False, sheet_name="Filtered")
-    out.seek(0)
-
+    # Download buttons; the serialised files are cached, so the rerun a click triggers
+    # doesn't rebuild them
     st.download_button(
         "📥 Download Excel",
-        data=out.getvalue(),
+        data=to_excel_bytes(filtered, "Filtered"),
         file_name="SC_CoStar_Joined.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
     )
+    st.download_button(
+        "📥 Download CSV",
+        data=to_csv_bytes(filtered),
+        file_name="SC_CoStar_Joined.csv",
+        mime="text/csv",
+    )
+    st.download_button(
+        "📥 Download Parquet",
+        data=to_parquet_bytes(filtered),
+        file_name="SC_CoStar_Joined.parquet",
+        mime="application/octet-stream",
+    )
 elif files:
     st.warning("Please upload **exactly two** Excel files to begin.")
@@ -0,0 +1,128 @@
+"""Helpers shared by the Streamlit scrubber scripts.
+
+Streamlit re-executes the entry script on every rerun, but imported modules are
+loaded once per process, so the constants here are set up once.
+"""
+import os
+from io import BytesIO
+
+import numpy as np
+import streamlit as st
+import xlsxwriter
+
+# Optional drop-in accelerator: SCRUBBER_BACKEND=fireducks swaps in FireDucks' pandas API
+if os.environ.get("SCRUBBER_BACKEND", "").lower() == "fireducks":
+    try:
+        import fireducks.pandas as pd
+    except ImportError:
+        import pandas as pd
+else:
+    import pandas as pd
+
+# Text columns load as Arrow-backed strings, so .str kernels run on packed UTF-8 buffers
+# (already the default from pandas 3)
+pd.set_option("future.infer_string", True)
+
+# Rust-backed calamine reader when installed; None lets pandas pick its default engine
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = None
+
+# Raw spellings of South Carolina matched without upper-casing the column
+SC_STATE_VALUES = ("SC", "sc", "Sc", "sC", "S.C.", "S.C")
+
+SIZE_MIN_SF = 1500
+SIZE_MAX_SF = 30000
+
+
+def rename_columns(df: pd.DataFrame, column_map: dict) -> pd.DataFrame:
+    """Rename the headers of df found in column_map, leaving the others untouched."""
+    # only the headers present in both get an entry; no identity mappings for the rest
+    return df.rename(columns={c: column_map[c] for c in df.columns if c in column_map})
+
+
+def clean_numeric(s: pd.Series) -> pd.Series:
+    """Strip everything but digits and dots from s and parse it as a number."""
+    # sheets that already parsed the column as numbers skip the string round-trip
+    if pd.api.types.is_numeric_dtype(s):
+        return s
+    # a plain pattern string keeps the replace on pyarrow's regex kernel; a compiled
+    # re.Pattern would drop to a per-row Python fallback
+    return pd.to_numeric(
+        s.astype("string[pyarrow]").str.replace(r"[^0-9.]", "", regex=True), errors="coerce"
+    )
+
+
+def _category_mask(s: pd.Series, category_hits) -> np.ndarray:
+    """Evaluate a predicate on a categorical Series' categories and broadcast it by code."""
+    hits = np.asarray(category_hits(s.cat.categories), dtype=bool)
+    # missing values have code -1, which picks the trailing False
+    return np.append(hits, False)[s.cat.codes.to_numpy()]
+
+
+def sc_retail_mask(df: pd.DataFrame) -> np.ndarray:
+    """Boolean array selecting retail properties in SC within the size band."""
+    # plain numpy arrays throughout, so the mask is built without Series alignment
+    property_type = df["property_type"]
+    if isinstance(property_type.dtype, pd.CategoricalDtype):
+        is_retail = _category_mask(
+            property_type, lambda cats: cats.astype(str).str.lower().str.contains("retail", regex=False)
+        )
+    else:
+        # literal substring on Arrow strings runs pyarrow's utf8_lower + match_substring kernels
+        property_type = property_type.astype("string[pyarrow]").str.lower()
+        is_retail = property_type.str.contains("retail", regex=False, na=False)
+        is_retail = is_retail.to_numpy(dtype=bool, na_value=False)
+    state = df["state"]
+    if isinstance(state.dtype, pd.CategoricalDtype):
+        is_sc = _category_mask(state, lambda cats: cats.isin(SC_STATE_VALUES))
+    else:
+        is_sc = state.isin(SC_STATE_VALUES).to_numpy()
+    size = df["size_sf"].to_numpy(dtype="float64", na_value=np.nan)
+    # combine in place into a single output array instead of one temporary per &
+    mask = size >= SIZE_MIN_SF
+    mask &= size <= SIZE_MAX_SF
+    mask &= is_retail
+    mask &= is_sc
+    return mask
+
+
+def compact_output(df: pd.DataFrame) -> pd.DataFrame:
+    """Shrink the result's dtypes before it is displayed and serialised."""
+    # whole-number sizes become ints, and repeated text columns dictionary-encode in
+    # Arrow (st.dataframe) and Parquet
+    cats = {c: df[c].astype("category") for c in ("state", "property_type", "city") if c in df.columns}
+    size_sf = pd.to_numeric(df["size_sf"], errors="coerce", downcast="integer")
+    return df.assign(size_sf=size_sf, **cats)
+
+
+@st.cache_data(show_spinner=False)
+def to_excel_bytes(df: pd.DataFrame, sheet_name: str) -> bytes:
+    """Write df as a single-sheet xlsx, streaming rows with xlsxwriter's constant_memory mode."""
+    # pandas' to_excel writes column by column, which constant_memory silently drops,
+    # so rows are written here in order. URL/formula detection is off to skip per-cell regex scans.
+    bio = BytesIO()
+    wb = xlsxwriter.Workbook(
+        bio, {"constant_memory": True, "strings_to_urls": False, "strings_to_formulas": False}
+    )
+    ws = wb.add_worksheet(sheet_name)
+    ws.write_row(0, 0, list(df.columns), wb.add_format({"bold": True}))
+    body = df.astype(object).where(df.notna(), None)
+    for r, row in enumerate(body.itertuples(index=False, name=None), start=1):
+        ws.write_row(r, 0, row)
+    wb.close()
+    return bio.getvalue()
+
+
+@st.cache_data(show_spinner=False)
+def to_parquet_bytes(df: pd.DataFrame) -> bytes:
+    bio = BytesIO()
+    df.to_parquet(bio, engine="pyarrow", compression="zstd", index=False)
+    return bio.getvalue()
+
+
+@st.cache_data(show_spinner=False)
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    return df.to_csv(index=False).encode("utf-8")